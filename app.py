@@ -1,10 +1,27 @@
+# Patch blocking I/O before anything else imports socket/ssl, so gevent workers can
+# serve other requests while one waits on DEX Screener or Postgres.
+# The patches apply on import under any server, so a sync worker still runs on the
+# patched stdlib and green psycopg2; it just serves one request at a time.
+from gevent import monkey
+monkey.patch_all()
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
 import os
 import logging
+import re
+import threading
+from operator import itemgetter
+from gevent.pool import Group
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+from flask_compress import Compress
 from sqlalchemy import create_engine, text
+import orjson
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache, cached
 from datetime import datetime, timedelta
 
 # Flask app setup
@@ -13,75 +30,219 @@ app = Flask(__name__)
 # Enable CORS for the app
 CORS(app)
 
+# Gzip token listings; they are repetitive JSON and shrink several-fold
+app.config["COMPRESS_ALGORITHM"] = ["gzip", "deflate"]
+app.config["COMPRESS_MIN_SIZE"] = 500
+app.config["COMPRESS_LEVEL"] = 6
+Compress(app)
+
 # Logging setup
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 # Environment variables
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://YOUR_DATABASE_URL_HERE").replace("postgres://", "postgresql://")
-DEX_API_URL = "https://api.dexscreener.com/latest/dex/tokens/solana"  # Solana-specific endpoint
+DEX_API_BASE_URL = "https://api.dexscreener.com/latest/dex/tokens"
+DEFAULT_CHAIN_ID = "solana"
+MAX_CHAINS_PER_REQUEST = 10
+CHAIN_ID_PATTERN = re.compile(r"[a-z0-9-]+")
+
+# Shared HTTP session so upstream calls reuse pooled keep-alive connections
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=100,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+))
 
 # Connect to the database
-engine = create_engine(DATABASE_URL)
+# Sized for gevent workers; pre-ping and recycle drop connections Postgres has idled out
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+
+# Token persistence statement, built once at import
+# COPY isn't available once psycogreen puts psycopg2 in green mode, so the batch goes
+# up as one array per column and unnest() turns it back into rows server-side;
+# created_at is left to the column default rather than sent with every row
+TOKEN_ROW = itemgetter("chainId", "pairAddress", "price", "liquidity", "volume")
+UPSERT_TOKENS = text("""
+INSERT INTO tokens (chain, pair_address, price, liquidity, volume)
+SELECT DISTINCT ON (chain, pair_address) chain, pair_address, price, liquidity, volume
+FROM unnest(
+    CAST(:chains AS VARCHAR[]),
+    CAST(:pair_addresses AS VARCHAR[]),
+    CAST(:prices AS FLOAT[]),
+    CAST(:liquidities AS FLOAT[]),
+    CAST(:volumes AS FLOAT[])
+) AS batch (chain, pair_address, price, liquidity, volume)
+ON CONFLICT (chain, pair_address) DO UPDATE SET
+    price = EXCLUDED.price,
+    liquidity = EXCLUDED.liquidity,
+    volume = EXCLUDED.volume,
+    created_at = EXCLUDED.created_at
+""")
 
 # Initialize database
 def initialize_database():
-    """Create the tokens table if it doesn't exist."""
+    """Create the tokens table and its indexes if they don't exist."""
     create_table_query = """
     CREATE TABLE IF NOT EXISTS tokens (
         id SERIAL PRIMARY KEY,
+        chain VARCHAR(64),
         pair_address VARCHAR(255),
         price FLOAT,
         liquidity FLOAT,
         volume FLOAT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
+    -- Tables created before tokens were keyed by chain lack the column and carry the old key;
+    -- their rows all came from the Solana-only endpoint
+    ALTER TABLE tokens ADD COLUMN IF NOT EXISTS chain VARCHAR(64);
+    UPDATE tokens SET chain = 'solana' WHERE chain IS NULL;
+    ALTER TABLE tokens DROP CONSTRAINT IF EXISTS tokens_pair_address_key;
+    DROP INDEX IF EXISTS tokens_pair_address_key;
+    -- Older tables hold a row per pair per request; keep the newest before enforcing uniqueness
+    DELETE FROM tokens a USING tokens b
+    WHERE a.chain = b.chain AND a.pair_address = b.pair_address AND a.id < b.id;
+    CREATE UNIQUE INDEX IF NOT EXISTS tokens_chain_pair_address_key ON tokens (chain, pair_address);
+    CREATE INDEX IF NOT EXISTS tokens_created_at_idx ON tokens (created_at);
     """
-    with engine.connect() as conn:
+    with engine.begin() as conn:
         conn.execute(text(create_table_query))
         logging.info("Database initialized.")
 
 # Fetch data from DEX API
-def fetch_data_from_dex():
-    """Fetch data from the DEX API for Solana."""
+# Upstream responses are reused for a few seconds so bursts of /tokens hits share one fetch
+@cached(cache=TTLCache(maxsize=64, ttl=5), lock=threading.Lock())
+def fetch_data_from_dex(chain_id=DEFAULT_CHAIN_ID):
+    """Fetch data from the DEX API for a chain."""
     try:
-        response = requests.get(DEX_API_URL)
+        response = session.get(f"{DEX_API_BASE_URL}/{chain_id}", timeout=(2, 5))
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         if "pairs" not in data or not data["pairs"]:
-            raise ValueError("No valid data available for Solana tokens.")
+            raise ValueError(f"No valid data available for {chain_id} tokens.")
         return data["pairs"]
     except Exception as e:
-        logging.error(f"Error fetching data from DEX: {e}")
+        logging.error("Error fetching data from DEX: %s", e)
         raise ValueError("Failed to fetch data from DEX Screener API.")
 
+def _fetch_or_error(chain_id):
+    """Fetch a chain's pairs, returning the error instead of raising it."""
+    try:
+        return fetch_data_from_dex(chain_id)
+    except ValueError as e:
+        return e
+
+def fetch_data_for_chains(chain_ids):
+    """Fetch data for several chains concurrently, returning {chain_id: pairs} for the chains that succeeded."""
+    # Each fetch runs in its own greenlet, so total latency is the slowest chain, not the sum
+    results = dict(zip(chain_ids, Group().map(_fetch_or_error, chain_ids)))
+    failed = [chain_id for chain_id, result in results.items() if isinstance(result, Exception)]
+    if len(failed) == len(results):
+        raise results[chain_ids[0]]
+    if failed:
+        logging.warning("Skipping chains that failed to fetch: %s", ", ".join(failed))
+    return {chain_id: result for chain_id, result in results.items() if chain_id not in failed}
+
 # Filter and process data
-def filter_data(raw_data):
-    """Apply filters to the raw Solana data."""
-    df = pd.DataFrame(raw_data)
-    if df.empty:
+def _to_float(value):
+    """Coerce an API number (usually a string) to float, treating missing or malformed values as 0."""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _nested_float(pair, field, key):
+    """Read pair[field][key] as a float, treating a missing or non-object field as 0."""
+    value = pair.get(field)
+    return _to_float(value.get(key)) if isinstance(value, dict) else 0.0
+
+def filter_data(raw_data, chain_id=DEFAULT_CHAIN_ID):
+    """Apply filters to the raw DEX pair data for a chain."""
+    if not raw_data:
         raise ValueError("No valid token data received.")
-    # Extract relevant fields
-    df["price"] = pd.to_numeric(df["priceUsd"], errors="coerce")
-    df["liquidity"] = pd.to_numeric(df["liquidity"].apply(lambda x: x["usd"]), errors="coerce")
-    df["volume"] = pd.to_numeric(df["volume"].apply(lambda x: x["h24"]), errors="coerce")
-    df["created_at"] = pd.to_datetime(datetime.utcnow())
-    
-    # Filter tokens with liquidity > 5000
-    df = df[(df["liquidity"] > 5000)]
-    if df.empty:
+    # Payloads are a few hundred pairs, so a single pass beats building a DataFrame
+    now = datetime.utcnow()
+    tokens = [
+        {
+            "chainId": chain_id,
+            "pairAddress": p["pairAddress"],
+            "price": _to_float(p.get("priceUsd")),
+            "liquidity": liquidity,
+            "volume": _nested_float(p, "volume", "h24"),
+            "created_at": now,
+        }
+        for p in raw_data
+        # Skip malformed pairs, then filter tokens with liquidity > 5000;
+        # liquidity is checked first so rejected pairs skip the other conversions
+        if isinstance(p, dict) and p.get("pairAddress")
+        and (liquidity := _nested_float(p, "liquidity", "usd")) > 5000
+    ]
+    if not tokens:
         raise ValueError("No tokens met the liquidity criteria.")
-    return df[["pairAddress", "price", "liquidity", "volume", "created_at"]]
+    return tokens
+
+# Persist filtered data
+def save_to_database(tokens):
+    """Upsert the filtered tokens, keeping one row per chain and pair with its latest figures."""
+    # Transpose the rows into one list per column; psycopg2 binds Python lists as arrays
+    chains, pair_addresses, prices, liquidities, volumes = (list(column) for column in zip(*map(TOKEN_ROW, tokens)))
+    with engine.begin() as conn:
+        conn.execute(UPSERT_TOKENS, {
+            "chains": chains,
+            "pair_addresses": pair_addresses,
+            "prices": prices,
+            "liquidities": liquidities,
+            "volumes": volumes,
+        })
+    logging.debug("Saved %d tokens to the database.", len(tokens))
 
 # API route: Fetch tokens
 @app.route('/tokens', methods=['GET'])
 def get_tokens():
-    """Fetch and return filtered Solana tokens."""
+    """Fetch and return filtered tokens for the chains in ?chains= (Solana by default).
+
+    Chains that fail to fetch or have no liquid tokens are left out of the response;
+    it is only an error when none of the requested chains yield any tokens.
+    """
+    # Accept both ?chains=a,b and ?chains=a&chains=b, ignoring blanks and repeats
+    chain_ids = list(dict.fromkeys(
+        chain.strip()
+        for arg in request.args.getlist("chains")
+        for chain in arg.split(",")
+        if chain.strip()
+    )) or [DEFAULT_CHAIN_ID]
+    if len(chain_ids) > MAX_CHAINS_PER_REQUEST:
+        return jsonify({"error": f"At most {MAX_CHAINS_PER_REQUEST} chains can be requested at once."}), 400
+    # Chain ids end up in the upstream URL path and the fetch cache key, so only accept plain slugs
+    invalid = [chain_id for chain_id in chain_ids if not CHAIN_ID_PATTERN.fullmatch(chain_id)]
+    if invalid:
+        return jsonify({"error": f"Invalid chain id: {invalid[0]}"}), 400
     try:
-        raw_data = fetch_data_from_dex()
-        filtered_data = filter_data(raw_data)
-        return jsonify(filtered_data.to_dict(orient="records"))
+        filtered_data = []
+        for chain_id, raw_data in fetch_data_for_chains(chain_ids).items():
+            try:
+                filtered_data.extend(filter_data(raw_data, chain_id))
+            except ValueError as e:
+                logging.warning("Skipping %s: %s", chain_id, e)
+        if not filtered_data:
+            raise ValueError("No tokens met the liquidity criteria.")
+        # Persistence is best-effort; a database outage shouldn't take down a read endpoint
+        try:
+            save_to_database(filtered_data)
+        except Exception as e:
+            logging.error("Error saving tokens to the database: %s", e)
+        response = app.response_class(orjson.dumps(filtered_data), mimetype="application/json")
+        # Matches the upstream fetch TTL, so intermediaries can serve repeats
+        response.headers["Cache-Control"] = "public, max-age=5"
+        return response
     except Exception as e:
-        logging.error(f"Error fetching tokens: {e}")
+        logging.error("Error fetching tokens: %s", e)
         return jsonify({"error": str(e)}), 500
 
 # API route: Health check